@@ -1,22 +1,72 @@
-import json
+import functools
+import html
 import os
+import threading
 
+import click
+import numpy as np
 import pandas as pd
-import plotly
 import spotipy
 from dotenv import load_dotenv
-from flask import Flask, render_template
+from flask import (
+    Flask,
+    abort,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_caching import Cache
 from spotipy.oauth2 import SpotifyClientCredentials
 
+from spotify_stats.cooccurrence import (
+    build_cooccurrence,
+    get_cooccurrence_fingerprint,
+    get_neighbours,
+    load_cooccurrence,
+    save_cooccurrence,
+)
+from spotify_stats.downsample import (
+    downsample_buckets,
+    downsample_lttb,
+    get_bucket_size,
+)
+from spotify_stats.event_store import (
+    get_source_info,
+    is_event_store_current,
+    read_event_store,
+    write_event_store,
+)
+from spotify_stats.get_cover import (
+    get_artist_image_urls,
+    get_cover_urls,
+    resolve_placeholders,
+)
+from spotify_stats.get_streams import split_streams
+from spotify_stats.search import (
+    NAME_COLUMNS,
+    build_search_index,
+    get_entity_stats,
+    search,
+)
+from spotify_stats.single_flight import single_flight_cached
+from spotify_stats.static_site import build_static_site
 from spotify_stats.stats import (
-    get_chart_hours_listened,
+    FREQUENCIES,
+    get_hours_listened,
     get_top_albums,
     get_top_artists,
+    get_top_episodes,
+    get_top_shows,
     get_top_skipped_songs,
     get_top_songs,
 )
-from spotify_stats.style_tables import style_pandas_html_table
+from spotify_stats.style_tables import (
+    style_pandas_html_table,
+    style_pandas_html_tables,
+)
+from spotify_stats.wrapped import get_wrapped_report
 
 # get Spotify developer credentials
 load_dotenv()
@@ -27,32 +77,108 @@ spotify = spotipy.Spotify(
     )
 )
 
-df = pd.read_csv("streaming_history.csv")
+HISTORY_PATH = "streaming_history.csv"
+
+# binary event store, create it with 'flask --app app store'
+STORE_PATH = "event_store"
+
 
 app = Flask(__name__)
 
+EVENT_STORES = {
+    "music": os.path.join(STORE_PATH, "music"),
+    "podcasts": os.path.join(STORE_PATH, "podcasts"),
+}
+
+
+def write_store():
+    # separate music tracks from podcast episodes
+    new_music, new_podcasts = split_streams(pd.read_csv(HISTORY_PATH))
+
+    write_event_store(new_music, EVENT_STORES["music"], source=HISTORY_PATH)
+    write_event_store(
+        new_podcasts, EVENT_STORES["podcasts"], source=HISTORY_PATH
+    )
+
+    return new_music, new_podcasts
+
+
+def load_streams():
+    if not os.path.isdir(STORE_PATH):
+        return split_streams(pd.read_csv(HISTORY_PATH))
+
+    if os.path.exists(HISTORY_PATH) and not all(
+        is_event_store_current(path, HISTORY_PATH)
+        for path in EVENT_STORES.values()
+    ):
+        # never serve an outdated store
+        app.logger.warning(
+            f"'{HISTORY_PATH}' changed, writing '{STORE_PATH}' again"
+        )
+        write_store()
+
+    # memory-mapped, no parsing needed
+    return (
+        read_event_store(EVENT_STORES["music"]),
+        read_event_store(EVENT_STORES["podcasts"]),
+    )
+
+
+def get_history_info():
+    # size and modification time of the streaming history, None if only
+    # the event store is available
+    if not os.path.exists(HISTORY_PATH):
+        return None
+
+    return get_source_info(HISTORY_PATH)
+
+
+# taken before loading, a change while loading is noticed as well
+loaded_history = get_history_info()
+music, podcasts = load_streams()
+
+# years covered by the streaming history
+years = sorted(int(year) for year in music["ts"].dt.year.unique())
+
 # flask-caching config
 app.config.from_mapping(
-    {"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 300}
+    {
+        "CACHE_TYPE": "SimpleCache",
+        "CACHE_DEFAULT_TIMEOUT": 300,
+        # serve expired pages for another hour while they are refreshed
+        "CACHE_STALE_TIMEOUT": 3600,
+    }
 )
 cache = Cache(app)
 
+# image URLs of /api/covers, separate so they do not evict cached pages
+cover_cache = Cache(
+    app,
+    config={
+        "CACHE_TYPE": "SimpleCache",
+        "CACHE_THRESHOLD": 20000,
+        # images do not change
+        "CACHE_DEFAULT_TIMEOUT": 0,
+    },
+)
+
 
 @app.route("/")
 def welcome():
-    return render_template("index.html")
+    return render_template("index.html", years=years)
 
 
 @app.route("/top-songs")
-@cache.cached()
+@single_flight_cached(cache)
 def display_top_songs():
     top_songs = get_top_songs(
-        df,
+        music,
         exclude_skipped=True,
         frequency=True,
         top=20,
-        spotify_credentials=spotify,
         cover=True,
+        # covers are loaded by the browser (see /api/covers)
+        deferred=True,
     )
 
     # pandas to html
@@ -65,14 +191,14 @@ def display_top_songs():
 
 
 @app.route("/top-albums")
-@cache.cached()
+@single_flight_cached(cache)
 def display_top_albums():
     top_albums = get_top_albums(
-        df,
+        music,
         exclude_skipped=True,
         top=20,
         cover=True,
-        spotify_credentials=spotify,
+        deferred=True,
     )
 
     # pandas to html
@@ -85,14 +211,14 @@ def display_top_albums():
 
 
 @app.route("/top-artists")
-@cache.cached()
+@single_flight_cached(cache)
 def display_top_artists():
     top_artists = get_top_artists(
-        df,
+        music,
         exclude_skipped=True,
         top=20,
         artist_image=True,
-        spotify_credentials=spotify,
+        deferred=True,
     )
 
     # pandas to html
@@ -105,10 +231,10 @@ def display_top_artists():
 
 
 @app.route("/top-skipped-songs")
-@cache.cached()
+@single_flight_cached(cache)
 def display_top_skipped_tracks():
     top_skipped_tracks = get_top_skipped_songs(
-        df, top=20, spotify_credentials=spotify, cover=True
+        music, top=20, cover=True, deferred=True
     )
 
     # pandas to html
@@ -120,19 +246,559 @@ def display_top_skipped_tracks():
     return top_skipped_tracks
 
 
+# maximum number of images per request to /api/covers
+MAX_COVERS = 100
+
+# columns with the track URIs and artists /api/covers accepts
+COVER_COLUMNS = {
+    "tracks": "spotify_track_uri",
+    "artists": "master_metadata_album_artist_name",
+}
+
+# images which were not found are looked up again after an hour
+COVER_MISS_TIMEOUT = 3600
+
+
+@app.route("/api/covers", methods=["POST"])
+def cover_urls():
+    """
+    Resolve the placeholder images of the table pages. Expects a json
+    body {"tracks": [<track uri>, ...], "artists": [<artist>, ...]} and
+    returns the image URLs by track URI and artist (null if not found).
+    Only track URIs and artists of the streaming history are looked up.
+    """
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400)
+
+    requested = {}
+    for kind in COVER_COLUMNS:
+        names = data.get(kind, [])
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            abort(400)
+        requested[kind] = list(dict.fromkeys(names[:MAX_COVERS]))
+
+    lookups = {"tracks": get_cover_urls, "artists": get_artist_image_urls}
+
+    images = {}
+    for kind, names in requested.items():
+        # names which are not part of the streaming history are ignored
+        known = music[COVER_COLUMNS[kind]].cat.categories
+        names = [
+            name
+            for name, position in zip(names, known.get_indexer(names))
+            if position >= 0
+        ]
+        keys = [f"cover/{kind}/{name}" for name in names]
+
+        # each image is only looked up once, "" marks images not found
+        cached = dict(zip(names, cover_cache.get_many(*keys)))
+        missing = [name for name in names if cached[name] is None]
+
+        if missing:
+            found = lookups[kind](missing, spotify)
+            cover_cache.set_many(
+                {
+                    f"cover/{kind}/{name}": url
+                    for name, url in found.items()
+                    if url is not None
+                }
+            )
+            cover_cache.set_many(
+                {
+                    f"cover/{kind}/{name}": ""
+                    for name, url in found.items()
+                    if url is None
+                },
+                timeout=COVER_MISS_TIMEOUT,
+            )
+            cached.update(found)
+
+        images[kind] = {name: url or None for name, url in cached.items()}
+
+    return jsonify(images)
+
+
+@app.route("/top-shows")
+@single_flight_cached(cache)
+def display_top_shows():
+    top_shows = get_top_shows(podcasts, top=20)
+
+    # pandas to html
+    top_shows = style_pandas_html_table(
+        data_frame=top_shows,
+        table_heading="&#127897; Your top podcasts &#127897;",
+    )
+
+    return top_shows
+
+
+@app.route("/top-episodes")
+@single_flight_cached(cache)
+def display_top_episodes():
+    top_episodes = get_top_episodes(podcasts, top=20)
+
+    # pandas to html
+    top_episodes = style_pandas_html_table(
+        data_frame=top_episodes,
+        table_heading="&#127897; Your top podcast episodes &#127897;",
+    )
+
+    return top_episodes
+
+
+@functools.cache
+def wrapped_report():
+    # top entries for all years at once
+    return get_wrapped_report(music, period="year", top=10)
+
+
+@app.route("/wrapped/<int:year>")
+@single_flight_cached(cache)
+def display_wrapped(year):
+    if year not in years:
+        abort(404)
+
+    headings = {
+        "artists": "Top artists",
+        "songs": "Top songs",
+        "albums": "Top albums",
+        "skipped_songs": "Top skipped songs",
+    }
+
+    report = wrapped_report()
+    tables = {
+        heading: report[metric][report[metric]["Year"] == year].drop(
+            columns=["Year"]
+        )
+        for metric, heading in headings.items()
+    }
+
+    # pandas to html
+    wrapped = style_pandas_html_tables(
+        data_frames=tables,
+        table_heading=f"&#127911; Your {year} wrapped &#127911;",
+    )
+
+    return wrapped
+
+
+# co-occurrence matrices are stored here
+COOCCURRENCE_PATH = "cooccurrence"
+
+# entities which can be browsed by '/listened-together/<kind>'
+LISTENED_TOGETHER = {"artists": "artist", "tracks": "track"}
+
+# number of entities listed on '/listened-together/<kind>'
+LISTENED_TOGETHER_TOP = 50
+
+# number of neighbours on '/listened-together/<kind>/<code>'
+LISTENED_TOGETHER_NEIGHBOURS = 20
+
+
+@functools.cache
+def cooccurrence(kind):
+    path = os.path.join(COOCCURRENCE_PATH, kind)
+
+    # only rebuild the matrix if the streaming history changed
+    if os.path.isdir(path):
+        matrix = load_cooccurrence(path)
+        fingerprint = get_cooccurrence_fingerprint(music, kind=kind)
+        if matrix.meta.get("fingerprint") == fingerprint:
+            return matrix
+
+    matrix = build_cooccurrence(music, kind=kind)
+    save_cooccurrence(matrix, path)
+
+    return matrix
+
+
+def top_entities(kind):
+    # most played artists (tracks) by code
+    plays = cooccurrence(LISTENED_TOGETHER[kind]).plays
+    return np.argsort(-plays, kind="stable")[:LISTENED_TOGETHER_TOP]
+
+
+def exported_entities(kind):
+    # listed artists (tracks) and their neighbours, i.e. all pages linked
+    # from '/listened-together/<kind>' and the pages it links to
+    matrix = cooccurrence(LISTENED_TOGETHER[kind])
+    codes = set()
+    for code in top_entities(kind):
+        codes.add(int(code))
+        neighbours = get_neighbours(
+            matrix, code, top=LISTENED_TOGETHER_NEIGHBOURS
+        )
+        codes.update(int(neighbour) for neighbour in neighbours["Code"])
+
+    return sorted(codes)
+
+
+def link_entities(data_frame, kind, codes):
+    # link the first name column (Artist or Track) to the neighbour page
+    column = "Artist" if kind == "artists" else "Track"
+    data_frame[column] = [
+        f"<a href='/listened-together/{kind}/{code}'>{html.escape(name)}</a>"
+        for code, name in zip(codes, data_frame[column])
+    ]
+
+    return data_frame
+
+
+@app.route("/listened-together/<kind>")
+@single_flight_cached(cache)
+def browse_cooccurrence(kind):
+    if kind not in LISTENED_TOGETHER:
+        abort(404)
+
+    matrix = cooccurrence(LISTENED_TOGETHER[kind])
+    codes = top_entities(kind)
+
+    top = matrix.labels.iloc[codes].reset_index(drop=True)
+    top.insert(0, "Place", np.arange(1, len(top) + 1))
+    top["Times played"] = matrix.plays[codes]
+
+    # pandas to html
+    table = style_pandas_html_table(
+        data_frame=link_entities(top, kind, codes),
+        table_heading=f"&#127911; Listened together: {kind} &#127911;",
+    )
+
+    return table
+
+
+@app.route("/listened-together/<kind>/<int:code>")
+@single_flight_cached(cache)
+def display_cooccurrence(kind, code):
+    if kind not in LISTENED_TOGETHER:
+        abort(404)
+
+    matrix = cooccurrence(LISTENED_TOGETHER[kind])
+    if code >= len(matrix.labels):
+        abort(404)
+
+    neighbours = get_neighbours(matrix, code, top=LISTENED_TOGETHER_NEIGHBOURS)
+    codes = neighbours.pop("Code")
+
+    name = html.escape(" - ".join(matrix.labels.iloc[code]))
+
+    # pandas to html
+    table = style_pandas_html_table(
+        data_frame=link_entities(neighbours, kind, codes),
+        table_heading=f"&#127911; Listened together with {name} &#127911;",
+    )
+
+    return table
+
+
+# maximum number of results of /api/search
+MAX_SEARCH_RESULTS = 50
+
+
+@functools.cache
+def search_index():
+    # names and stats of all artists, albums and tracks, built once
+    return build_search_index(music)
+
+
+@app.route("/search")
+def display_search():
+    return render_template("search.html")
+
+
+@app.route("/api/search")
+def search_entities():
+    """
+    Autocomplete artist, album and track names. Returns the entities
+    whose name (or a word of it) starts with 'q', most played first.
+    """
+
+    query = request.args.get("q", default="")
+    limit = request.args.get("limit", default=10, type=int)
+    limit = min(max(limit, 1), MAX_SEARCH_RESULTS)
+
+    results = search(search_index(), query, limit=limit)
+    for result in results:
+        result["url"] = f"/{result['kind']}/{result['code']}"
+
+    return jsonify({"query": query, "results": results})
+
+
+@app.route("/<any(artist, album, track):kind>/<int:code>")
+@single_flight_cached(cache)
+def display_entity(kind, code):
+    index = search_index()
+    if code >= len(index.labels[kind]):
+        abort(404)
+
+    stats, monthly = get_entity_stats(index, kind, code)
+
+    # album and artist of a track, artist of an album
+    labels = index.labels[kind].iloc[code]
+    name = labels[NAME_COLUMNS[kind]]
+    names = labels.drop(NAME_COLUMNS[kind])
+
+    table = pd.DataFrame(
+        {
+            "Plays": [stats["plays"]],
+            "Skips": [stats["skips"]],
+            "Hours listened": [round(stats["hours"], 2)],
+            "First played": [stats["first_played"].strftime("%Y-%m-%d")],
+            "Last played": [stats["last_played"].strftime("%Y-%m-%d")],
+        }
+    )
+
+    # codes of the co-occurrence matrices are the same
+    together = f"/listened-together/{kind}s/{code}"
+
+    return render_template(
+        "entity.html",
+        kind=kind,
+        name=name,
+        names=names.to_dict(),
+        table=table.to_html(classes="mystyle", index=False),
+        months=monthly["month"].tolist(),
+        hours=monthly["hours"].round(2).tolist(),
+        plays=monthly["plays"].tolist(),
+        together=together if f"{kind}s" in LISTENED_TOGETHER else None,
+    )
+
+
 @app.route("/hours-listened")
-@cache.cached()
+@single_flight_cached(cache)
 def display_bar_chart():
-    bar_chart = get_chart_hours_listened(df)
+    # the chart is built in the browser from /api/hours-listened/<freq>.json
+    return render_template("bar_chart.html", frequencies=list(FREQUENCIES))
+
+
+# default number of points of a chart (about its width in pixels)
+CHART_POINTS = 1024
+
+# points are rounded up to a power of two within these bounds, thus
+# only a few variants of the chart data are cached
+MIN_CHART_POINTS = 16
+MAX_CHART_POINTS = 8192
+
+CHART_METHODS = ["sum", "lttb"]
+
+# x axis labels of the chart data
+DATE_FORMATS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+
+@functools.cache
+def hours_listened(freq):
+    # music and podcasts, like the whole streaming history
+    columns = ["ts", "minutes_played"]
+    streams = pd.concat(
+        [music[columns], podcasts[columns]], ignore_index=True
+    ).sort_values("ts")
+
+    return get_hours_listened(streams, freq=freq)
+
+
+@app.route("/api/hours-listened/<freq>.json")
+@single_flight_cached(cache, query_string=True)
+def chart_data(freq):
+    """
+    Hours listened per hour, day, week or month as columnar series.
+    Downsampled to at most 'points' values (rounded up to a power of
+    two), either by summing up consecutive periods (method=sum) or with
+    LTTB (method=lttb).
+    'bucket' is the number of periods summed up per value, 'x' and
+    'x_end' are the first and last period of each value.
+    """
+
+    if freq not in FREQUENCIES:
+        abort(404)
+
+    points = request.args.get("points", default=CHART_POINTS, type=int)
+    points = min(max(points, MIN_CHART_POINTS), MAX_CHART_POINTS)
+    points = 1 << (points - 1).bit_length()
+
+    method = request.args.get("method", default="sum")
+    if method not in CHART_METHODS:
+        abort(400)
+
+    # any other query string is redirected, only these are cached
+    canonical = {"points": str(points), "method": method}
+    if request.args and request.args.to_dict() != canonical:
+        return redirect(url_for("chart_data", freq=freq, **canonical))
+
+    hours = hours_listened(freq)
+    y = hours.to_numpy()
+
+    if method == "lttb":
+        # selects single periods
+        bucket = 1
+        positions, y = downsample_lttb(np.arange(len(y)), y, n_out=points)
+        x = x_end = hours.index[positions]
+    else:
+        bucket = get_bucket_size(len(y), points)
+        x, y = downsample_buckets(hours.index, y, n_out=points)
+        # the last bucket may be shorter
+        x_end = hours.index[
+            np.minimum(np.arange(len(x)) * bucket + bucket, len(hours)) - 1
+        ]
+
+    return jsonify(
+        {
+            "freq": freq,
+            "bucket": bucket,
+            "total_hours": round(float(hours.sum()), 2),
+            "x": x.strftime(DATE_FORMATS[freq]).tolist(),
+            "x_end": x_end.strftime(DATE_FORMATS[freq]).tolist(),
+            "y": np.round(y, 2).tolist(),
+        }
+    )
+
+
+@app.route("/healthz")
+def liveness():
+    return jsonify({"status": "ok"})
+
+
+# set when the worker is shutting down (see gunicorn.conf.py)
+draining = threading.Event()
+
+
+def is_warmed_up():
+    """
+    Check whether the aggregates of warm_up() are computed in this
+    process.
+    """
+
+    return (
+        search_index.cache_info().currsize > 0
+        and cooccurrence.cache_info().currsize >= len(LISTENED_TOGETHER)
+        and wrapped_report.cache_info().currsize > 0
+        and hours_listened.cache_info().currsize >= len(FREQUENCIES)
+    )
+
+
+@app.route("/readyz")
+def readiness():
+    # not ready while shutting down, if the streaming history changed
+    # since it was loaded (reload with SIGHUP) or if the aggregates are
+    # not precomputed yet
+    if draining.is_set():
+        return jsonify({"status": "shutting down"}), 503
+
+    if get_history_info() != loaded_history:
+        return jsonify({"status": "streaming history changed"}), 503
+
+    if not is_warmed_up():
+        return jsonify({"status": "warming up"}), 503
 
-    # Create graphJSON
-    bar_chart_json = json.dumps(bar_chart, cls=plotly.utils.PlotlyJSONEncoder)
+    return jsonify({"status": "ready", "streams": len(music)})
+
+
+def warm_up():
+    """
+    Precompute the aggregates every worker needs (search index,
+    co-occurrence matrices, wrapped report, chart data). Called in the
+    gunicorn master before the workers are forked, which then share the
+    results.
+    """
+
+    search_index()
+    for kind in LISTENED_TOGETHER.values():
+        cooccurrence(kind)
+    wrapped_report()
+    for freq in FREQUENCIES:
+        hours_listened(freq)
+
+
+def reload_data():
+    """
+    Load the streaming history again and drop everything computed from
+    it. Called in the gunicorn master on a graceful reload (SIGHUP).
+    """
+
+    global loaded_history, music, podcasts, years
+
+    loaded_history = get_history_info()
+    music, podcasts = load_streams()
+    years = sorted(int(year) for year in music["ts"].dt.year.unique())
+
+    cache.clear()
+    for function in [
+        search_index,
+        cooccurrence,
+        wrapped_report,
+        hours_listened,
+    ]:
+        function.cache_clear()
+
+
+@app.cli.command("store")
+def store():
+    """
+    Write the streaming history to the binary event store, which is
+    loaded on start-up instead of the csv file.
+    """
+
+    new_music, new_podcasts = write_store()
+
+    click.echo(
+        f"Wrote {len(new_music)} songs and {len(new_podcasts)} "
+        f"podcast episodes to '{STORE_PATH}'."
+    )
+
+
+@app.cli.command("build")
+@click.argument("out_dir", default="site")
+@click.option("--force", is_flag=True, help="Rebuild every page.")
+def build(out_dir, force):
+    """
+    Prerender every page into a static site, e.g.
+    'flask --app app build site'.
+    """
+
+    # templates leave out what needs the running app (e.g. search)
+    app.config["STATIC_SITE"] = True
+
+    built = build_static_site(
+        app,
+        out_dir,
+        # every page depends on the streaming history and the code
+        inputs=[HISTORY_PATH, STORE_PATH, "app.py", "spotify_stats"],
+        page_inputs={
+            "welcome": ["templates/index.html"],
+            "display_bar_chart": ["templates/bar_chart.html"],
+        },
+        url_values={
+            "display_wrapped": lambda: [{"year": year} for year in years],
+            "chart_data": lambda: [{"freq": freq} for freq in FREQUENCIES],
+            "browse_cooccurrence": lambda: [
+                {"kind": kind} for kind in LISTENED_TOGETHER
+            ],
+            "display_cooccurrence": lambda: [
+                {"kind": kind, "code": code}
+                for kind in LISTENED_TOGETHER
+                for code in exported_entities(kind)
+            ],
+        },
+        # covers and artist images are part of the static pages
+        process_html=lambda html: resolve_placeholders(html, spotify),
+        # only work with the running app
+        exclude=["display_search", "search_entities", "liveness", "readiness"],
+        force=force,
+    )
 
-    return render_template("bar_chart.html", graphJSON=bar_chart_json)
+    click.echo(f"Built {len(built)} page(s) in '{out_dir}'.")
 
 
 if __name__ == "__main__":
-    # to run in container
+    # development server, the container runs gunicorn (see gunicorn.conf.py)
+    warm_up()
     app.run(host="0.0.0.0", port=80)
 
     # use app.run() if you are not containerizing the application
@@ -0,0 +1,70 @@
+# gunicorn config, run with 'gunicorn app:app'
+import gc
+import multiprocessing
+import os
+import signal
+
+bind = os.getenv("BIND", "0.0.0.0:80")
+
+# one worker per core by default
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# threads per worker, requests waiting for the same page are coalesced
+# within a worker (see single_flight_cached())
+worker_class = "gthread"
+threads = int(os.getenv("THREADS", 4))
+
+# load the streaming history once in the master, the forked workers
+# share it copy-on-write instead of loading it once per worker
+preload_app = True
+
+# time to finish running requests on reload or shutdown
+graceful_timeout = 30
+
+
+def _freeze() -> None:
+    # objects created so far are never collected, hence the garbage
+    # collector of the workers does not touch (and copy) their memory
+    gc.collect()
+    gc.freeze()
+
+
+def when_ready(server):
+    import app
+
+    # precompute the aggregates before the first worker is forked
+    app.warm_up()
+    _freeze()
+    server.log.info("Streaming history loaded and aggregates precomputed")
+
+
+def on_reload(server):
+    import app
+
+    # SIGHUP: load the streaming history again, the new workers are
+    # forked from the reloaded master before the old ones are stopped
+    gc.unfreeze()
+    app.reload_data()
+    app.warm_up()
+    _freeze()
+    server.log.info("Streaming history reloaded")
+
+
+def post_worker_init(worker):
+    import app
+
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        # SIGTERM: /readyz answers 503 while the running requests finish
+        app.draining.set()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_int(worker):
+    import app
+
+    # SIGINT or SIGQUIT: the worker stops right away
+    app.draining.set()
@@ -0,0 +1,78 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# mimetypes worth compressing
+COMPRESSIBLE = ("text/", "application/json", "application/javascript")
+
+# smaller bodies are sent as is
+MIN_SIZE = 500
+
+
+def compress_variants(body: bytes, mimetype: str) -> dict[str, bytes]:
+    """
+    Compress a response body with every available encoding. Returns the
+    compressed bodies by content encoding ('br' and 'gzip'), an empty
+    dictionary if the body is too small or not compressible.
+
+    Arguments:
+    ---------
+
+    body: response body
+
+    mimetype: mimetype of the response
+    """
+
+    if len(body) < MIN_SIZE or not mimetype.startswith(COMPRESSIBLE):
+        return {}
+
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, mode=brotli.MODE_TEXT)
+
+    return variants
+
+
+def choose_encoding(accept_encoding: str, available: list[str]) -> str | None:
+    """
+    Choose the content encoding for a response based on the
+    'Accept-Encoding' header of the request. Prefers brotli over gzip,
+    returns None if the body should be sent uncompressed.
+
+    Arguments:
+    ---------
+
+    accept_encoding: value of the 'Accept-Encoding' header
+
+    available: available content encodings
+
+    Example:
+    -------
+
+    >>> choose_encoding("gzip, deflate, br", ["gzip", "br"])
+    'br'
+    >>> choose_encoding("gzip;q=0", ["gzip"])
+    """
+
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        encoding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[encoding.strip()] = quality
+
+    for encoding in ("br", "gzip"):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and quality > 0:
+            return encoding
+
+    return None
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from spotify_stats.entities import get_entity_codes
+
+# arrays of a co-occurrence matrix on disk
+ARRAYS = ["indptr", "indices", "data", "plays"]
+
+
+class CooccurrenceMatrix(NamedTuple):
+    """
+    Sparse, symmetric entity x entity matrix in CSR layout. The
+    neighbours of entity i are indices[indptr[i]:indptr[i + 1]], the
+    number of times they were played together data[indptr[i]:...].
+    """
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    # number of streams per entity
+    plays: np.ndarray
+    # names of the entities (row i belongs to entity i)
+    labels: pd.DataFrame
+    # kind, window, number of streams and fingerprint of the history the
+    # matrix was built from
+    meta: dict
+
+
+def _fingerprint(
+    ts: np.ndarray,
+    codes: np.ndarray,
+    labels: pd.DataFrame,
+    window_minutes: float,
+    max_lag: int,
+) -> str:
+    """
+    Hash of everything a co-occurrence matrix is built from.
+    """
+
+    digest = hashlib.sha256(f"{window_minutes}/{max_lag}".encode())
+    digest.update(np.ascontiguousarray(ts).tobytes())
+    digest.update(np.ascontiguousarray(codes).tobytes())
+    digest.update(json.dumps(labels.to_dict(orient="list")).encode())
+
+    return digest.hexdigest()
+
+
+def _timestamps(df: pd.DataFrame) -> np.ndarray:
+    ts = pd.to_datetime(df["ts"]).to_numpy().astype("datetime64[ns]")
+    return ts.view("int64")
+
+
+def get_cooccurrence_fingerprint(
+    df: pd.DataFrame,
+    kind: str = "artist",
+    window_minutes: float = 30,
+    max_lag: int = 50,
+) -> str:
+    """
+    Fingerprint of the co-occurrence matrix build_cooccurrence() would
+    build with the same arguments: a hash of the timestamps, the
+    artists (albums, tracks) and their names as well as the window.
+    Compare it with matrix.meta["fingerprint"] to check if a saved
+    matrix is outdated.
+
+    Arguments:
+    ---------
+
+    see build_cooccurrence()
+
+    Example:
+    -------
+
+    >>> matrix = load_cooccurrence("cooccurrence/artist")
+    >>> matrix.meta["fingerprint"] == get_cooccurrence_fingerprint(music)
+    True
+    """
+
+    codes, labels = get_entity_codes(df, kind)
+
+    return _fingerprint(
+        _timestamps(df), codes, labels, window_minutes, max_lag
+    )
+
+
+def build_cooccurrence(
+    df: pd.DataFrame,
+    kind: str = "artist",
+    window_minutes: float = 30,
+    max_lag: int = 50,
+) -> CooccurrenceMatrix:
+    """
+    Count how often two artists (albums, tracks) were played together,
+    i.e. within a sliding time window. Two streams are played together
+    if they started at most 'window_minutes' apart and at most
+    'max_lag' streams lie in between. Streams of the same entity are not
+    counted.
+
+    Instead of comparing all pairs of streams, the sorted history is
+    compared with itself shifted by 1, 2, ..., max_lag streams. Thus,
+    the cost is linear in the length of the history and the result is
+    stored sparse, which scales to hundreds of thousands of tracks.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the music part of a spotify streaming
+        history (see split_streams())
+
+    kind: 'artist', 'album' or 'track'
+
+    window_minutes: maximum time between two streams in minutes
+
+    max_lag: maximum number of streams between two streams
+
+    Example:
+    -------
+
+    >>> matrix = build_cooccurrence(music, kind="artist")
+    >>> get_neighbours(matrix, code=0, top=3)
+    """
+
+    codes, labels = get_entity_codes(df, kind)
+    n_entities = len(labels)
+
+    ts = _timestamps(df)
+    fingerprint = _fingerprint(ts, codes, labels, window_minutes, max_lag)
+
+    # sliding windows need a sorted history
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        ts, codes = ts[order], codes[order]
+
+    window = int(window_minutes * 60 * 1e9)
+
+    keys = []
+    counts = []
+    for lag in range(1, max_lag + 1):
+        if lag >= len(ts):
+            break
+
+        within = ts[lag:] - ts[:-lag] <= window
+        if not within.any():
+            # larger lags are even further apart
+            break
+
+        first, second = codes[:-lag], codes[lag:]
+        pairs = within & (first >= 0) & (second >= 0) & (first != second)
+
+        # undirected pair as single key
+        low = np.minimum(first[pairs], second[pairs])
+        high = np.maximum(first[pairs], second[pairs])
+        lag_keys, lag_counts = np.unique(
+            low * n_entities + high, return_counts=True
+        )
+
+        keys.append(lag_keys)
+        counts.append(lag_counts)
+
+    if keys:
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(counts))
+    else:
+        keys = np.empty(0, dtype=np.int64)
+        counts = np.empty(0)
+
+    low, high = np.divmod(keys, n_entities)
+
+    # symmetric matrix: store (low, high) and (high, low)
+    rows = np.concatenate([low, high])
+    columns = np.concatenate([high, low])
+    data = np.concatenate([counts, counts]).astype(np.int32)
+
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(n_entities + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_entities), out=indptr[1:])
+
+    plays = np.bincount(codes[codes >= 0], minlength=n_entities)
+
+    return CooccurrenceMatrix(
+        indptr=indptr,
+        indices=columns[order].astype(np.int32),
+        data=data[order],
+        plays=plays.astype(np.int64),
+        labels=labels,
+        meta={
+            "kind": kind,
+            "window_minutes": window_minutes,
+            "max_lag": max_lag,
+            "n_streams": len(df),
+            "fingerprint": fingerprint,
+        },
+    )
+
+
+def get_neighbours(
+    matrix: CooccurrenceMatrix,
+    code: int,
+    top: int | None = 10,
+    normalize: bool = True,
+) -> pd.DataFrame:
+    """
+    Get the artists (albums, tracks) which were played together the most
+    with a given one.
+
+    Arguments:
+    ---------
+
+    matrix: co-occurrence matrix (see build_cooccurrence())
+
+    code: code of the artist (album, track), i.e. its row in
+        matrix.labels
+
+    top: int specifying the number of neighbours
+
+    normalize: if true -> rank by the number of times played together
+        divided by the geometric mean of the number of streams of both
+        (cosine similarity), otherwise by the number of times played
+        together. Normalizing prevents artists which are played a lot
+        from being the neighbour of everyone.
+
+    Example:
+    -------
+
+    >>> matrix = build_cooccurrence(music, kind="artist")
+    >>> get_neighbours(matrix, code=17, top=3)
+       Place  Code     Artist  Played together  Score
+    0      1     9  Artist 17               58  0.112
+    1      2    37  Artist 42               51  0.098
+    2      3     6  Artist 14               47  0.091
+    """
+
+    start, end = matrix.indptr[code], matrix.indptr[code + 1]
+    neighbours = np.asarray(matrix.indices[start:end])
+    together = np.asarray(matrix.data[start:end])
+
+    if normalize:
+        scores = together / np.sqrt(
+            matrix.plays[code] * matrix.plays[neighbours]
+        )
+    else:
+        scores = together.astype(np.float64)
+
+    if top is not None and len(scores) > top:
+        # select the top entries without sorting all of them
+        selected = np.argpartition(-scores, top - 1)[:top]
+        neighbours = neighbours[selected]
+        together = together[selected]
+        scores = scores[selected]
+
+    order = np.argsort(-scores, kind="stable")
+
+    top_neighbours = matrix.labels.iloc[neighbours[order]].reset_index(
+        drop=True
+    )
+    top_neighbours.insert(0, "Code", neighbours[order])
+    top_neighbours.insert(0, "Place", np.arange(1, len(order) + 1))
+    top_neighbours["Played together"] = together[order]
+    top_neighbours["Score"] = np.round(scores[order], 3)
+
+    return top_neighbours
+
+
+def save_cooccurrence(matrix: CooccurrenceMatrix, path: str) -> None:
+    """
+    Write a co-occurrence matrix to a directory (one .npy file per array,
+    the labels and meta data as json). An existing matrix is replaced.
+
+    Arguments:
+    ---------
+
+    matrix: co-occurrence matrix (see build_cooccurrence())
+
+    path: directory to write to
+    """
+
+    tmp_path = path.rstrip("/") + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(matrix, name))
+
+    with open(
+        os.path.join(tmp_path, "labels.json"), "w", encoding="utf-8"
+    ) as file:
+        json.dump(matrix.labels.to_dict(orient="list"), file)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as file:
+        json.dump(matrix.meta, file, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def load_cooccurrence(path: str) -> CooccurrenceMatrix:
+    """
+    Load a co-occurrence matrix written by save_cooccurrence(). The
+    arrays are memory-mapped, hence loading is instant and processes
+    share the data.
+
+    Arguments:
+    ---------
+
+    path: directory of the matrix
+    """
+
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in ARRAYS
+    }
+
+    with open(os.path.join(path, "labels.json"), encoding="utf-8") as file:
+        labels = pd.DataFrame(json.load(file))
+
+    with open(os.path.join(path, "meta.json")) as file:
+        meta = json.load(file)
+
+    return CooccurrenceMatrix(**arrays, labels=labels, meta=meta)
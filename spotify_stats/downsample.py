@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def get_bucket_size(n: int, n_out: int) -> int:
+    """
+    Number of consecutive values downsample_buckets() sums up per bucket
+    to reduce n values to at most n_out.
+    """
+
+    if n_out < 1:
+        raise ValueError(f"n_out must be at least 1, got {n_out}")
+
+    return max(int(np.ceil(n / n_out)), 1)
+
+
+def downsample_buckets(
+    x: np.ndarray, y: np.ndarray, n_out: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample a series by summing up consecutive values into (at most)
+    n_out equally sized buckets. Each bucket is labelled with its first x
+    value. Suited for bar charts as the total stays the same.
+
+    Arguments:
+    ---------
+
+    x: x values (e.g. dates), sorted
+
+    y: y values
+
+    n_out: maximum number of points to return (see get_bucket_size())
+
+    Example:
+    -------
+
+    >>> downsample_buckets(np.arange(6), np.ones(6), n_out=3)
+    (array([0, 2, 4]), array([2., 2., 2.]))
+    """
+
+    # number of original points per bucket
+    size = get_bucket_size(len(x), n_out)
+    if size == 1:
+        return x, y
+
+    starts = np.arange(0, len(x), size)
+
+    return x[starts], np.add.reduceat(y, starts)
+
+
+def downsample_lttb(
+    x: np.ndarray, y: np.ndarray, n_out: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm
+    (Steinarsson, 2013). Keeps the visual shape (peaks and dips) of the
+    series by selecting the point of each bucket which forms the largest
+    triangle with its neighbouring buckets. Suited for line charts.
+
+    Arguments:
+    ---------
+
+    x: x values, sorted and numeric (convert dates to numbers first)
+
+    y: y values
+
+    n_out: maximum number of points to return (at least 3)
+
+    Example:
+    -------
+
+    >>> x = np.arange(1000)
+    >>> x_small, y_small = downsample_lttb(x, np.sin(x / 50), n_out=100)
+    >>> len(x_small)
+    100
+    """
+
+    if n_out < 3:
+        raise ValueError(f"n_out must be at least 3, got {n_out}")
+
+    if len(x) <= n_out:
+        return x, y
+
+    x_num = np.asarray(x, dtype="float64")
+    y_num = np.asarray(y, dtype="float64")
+
+    # first and last point are always kept, the rest is split into
+    # n_out - 2 buckets
+    edges = np.linspace(1, len(x) - 1, n_out - 1).astype(np.int64)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = len(x) - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # average of the next bucket (or the last point)
+        if i < n_out - 3:
+            next_end = edges[i + 2]
+            next_x = x_num[end:next_end].mean()
+            next_y = y_num[end:next_end].mean()
+        else:
+            next_x, next_y = x_num[-1], y_num[-1]
+
+        # (doubled) area of the triangles previous point -> candidate ->
+        # next average
+        areas = np.abs(
+            (x_num[previous] - next_x) * (y_num[start:end] - y_num[previous])
+            - (x_num[previous] - x_num[start:end]) * (next_y - y_num[previous])
+        )
+
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return x[selected], y[selected]
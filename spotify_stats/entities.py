@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# columns identifying an artist, album or track
+ENTITY_COLUMNS = {
+    "artist": ["master_metadata_album_artist_name"],
+    "album": [
+        "master_metadata_album_album_name",
+        "master_metadata_album_artist_name",
+    ],
+    "track": [
+        "master_metadata_track_name",
+        "master_metadata_album_album_name",
+        "master_metadata_album_artist_name",
+    ],
+}
+
+NEW_NAMES = {
+    "master_metadata_track_name": "Track",
+    "master_metadata_album_album_name": "Album",
+    "master_metadata_album_artist_name": "Artist",
+}
+
+
+def get_entity_codes(
+    df: pd.DataFrame, kind: str
+) -> tuple[np.ndarray, pd.DataFrame]:
+    """
+    Number the distinct artists, albums or tracks of a streaming history.
+    Returns the integer code of every stream (-1 if it has no artist,
+    album or track) and a data frame with the names of each code
+    (row i belongs to code i).
+
+    Like in the stats functions, a track is identified by its track,
+    album and artist name and an album by its album and artist name.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the music part of a spotify streaming
+        history (see split_streams())
+
+    kind: 'artist', 'album' or 'track'
+
+    Example:
+    -------
+
+    >>> codes, labels = get_entity_codes(music, "artist")
+    >>> labels.iloc[codes[0]]
+    Artist    Artist 24
+    Name: 17, dtype: object
+    """
+
+    if kind not in ENTITY_COLUMNS:
+        raise ValueError(
+            f"kind must be one of {list(ENTITY_COLUMNS)}, got '{kind}'"
+        )
+
+    grouped = df.groupby(ENTITY_COLUMNS[kind], observed=True, sort=True)
+
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+    labels = (
+        grouped.size()
+        .index.to_frame(index=False)
+        .rename(columns=NEW_NAMES)
+        .astype(str)
+    )
+
+    return codes, labels
@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# describes the columns of an event store
+SCHEMA_NAME = "schema.json"
+
+STORE_VERSION = 1
+
+
+def get_source_info(source: str) -> dict:
+    """
+    Size and modification time of the file an event store is written
+    from (e.g. the csv file of the streaming history).
+    """
+
+    stat = os.stat(source)
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_event_store(
+    df: pd.DataFrame, path: str, source: str | None = None
+) -> None:
+    """
+    Write a streaming history to a binary event store. Every column is
+    written to its own file as raw array:
+
+    - timestamps as int64 (nanoseconds since epoch, UTC)
+    - numbers (e.g. minutes played) with their dtype (float32 if the
+      data frame is compact, see split_streams())
+    - strings (names, URIs, reason_end) as integer codes, the distinct
+      values are written to a separate json file
+
+    The store can be loaded instantly with read_event_store(). An
+    existing store is replaced at once, processes which still map the
+    old files are not affected.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with a spotify streaming history, e.g. the
+        music or the podcast table of split_streams()
+
+    path: directory of the event store
+
+    source: file the streaming history was read from. Its size and
+        modification time are recorded to detect an outdated store
+        (see is_event_store_current())
+
+    Example:
+    -------
+
+    >>> music, podcasts = split_streams(pd.read_csv("streaming_history.csv"))
+    >>> write_event_store(music, "event_store/music")
+    >>> write_event_store(podcasts, "event_store/podcasts")
+    """
+
+    tmp_path = path.rstrip("/") + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for name in df.columns:
+        column = df[name]
+
+        if pd.api.types.is_datetime64_any_dtype(column):
+            if column.dt.tz is not None:
+                column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+            values = column.to_numpy().astype("datetime64[ns]").view("int64")
+            columns.append({"name": name, "kind": "datetime"})
+
+        elif pd.api.types.is_numeric_dtype(column) and not isinstance(
+            column.dtype, pd.CategoricalDtype
+        ):
+            values = column.to_numpy()
+            columns.append(
+                {"name": name, "kind": "numeric", "dtype": values.dtype.str}
+            )
+
+        else:
+            column = column.astype("category")
+            # codes use the smallest integer type pandas chooses for the
+            # number of categories -> no copy on read
+            values = column.cat.codes.to_numpy()
+            columns.append(
+                {"name": name, "kind": "category", "dtype": values.dtype.str}
+            )
+
+            with open(
+                os.path.join(tmp_path, f"{name}.categories.json"),
+                "w",
+                encoding="utf-8",
+            ) as file:
+                json.dump(column.cat.categories.tolist(), file)
+
+        np.ascontiguousarray(values).tofile(
+            os.path.join(tmp_path, f"{name}.bin")
+        )
+
+    schema = {
+        "version": STORE_VERSION,
+        "length": len(df),
+        "source": get_source_info(source) if source is not None else None,
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_path, SCHEMA_NAME), "w") as file:
+        json.dump(schema, file, indent=2)
+
+    # swap in the new store
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def is_event_store_current(path: str, source: str) -> bool:
+    """
+    Check if an event store exists and was written from the current
+    version of a file, i.e. the file did not change since.
+
+    Arguments:
+    ---------
+
+    path: directory of the event store
+
+    source: file the event store was written from
+
+    Example:
+    -------
+
+    >>> is_event_store_current("event_store/music", "streaming_history.csv")
+    True
+    """
+
+    schema_path = os.path.join(path, SCHEMA_NAME)
+    if not os.path.exists(schema_path):
+        return False
+
+    with open(schema_path) as file:
+        schema = json.load(file)
+
+    return schema.get("source") == get_source_info(source)
+
+
+def _map_column(path: str, name: str, dtype: str, length: int) -> np.ndarray:
+    """
+    Memory-map a column of an event store (read-only).
+    """
+
+    if length == 0:
+        # empty files can not be mapped
+        return np.empty(0, dtype=dtype)
+
+    mapped = np.memmap(
+        os.path.join(path, f"{name}.bin"),
+        dtype=dtype,
+        mode="r",
+        shape=(length,),
+    )
+
+    # plain array view, results of computations should not be memmaps
+    return np.asarray(mapped)
+
+
+def read_event_store(path: str) -> pd.DataFrame:
+    """
+    Load a streaming history written by write_event_store(). The columns
+    are memory-mapped and wrapped by the data frame without copying.
+    Hence, loading does not depend on the size of the history and
+    processes (e.g. forked workers) share the data through the page
+    cache of the OS. The stats functions run directly on the mapped
+    data. Timestamps are returned as UTC.
+
+    The data is read-only, new columns can still be added.
+
+    Arguments:
+    ---------
+
+    path: directory of the event store
+
+    Example:
+    -------
+
+    >>> music = read_event_store("event_store/music")
+    >>> get_top_artists(music, top=3)
+    """
+
+    with open(os.path.join(path, SCHEMA_NAME)) as file:
+        schema = json.load(file)
+
+    if schema["version"] != STORE_VERSION:
+        raise ValueError(
+            f"Unsupported event store version {schema['version']}, "
+            "write the event store again"
+        )
+
+    length = schema["length"]
+
+    data = {}
+    for column in schema["columns"]:
+        name = column["name"]
+
+        if column["kind"] == "datetime":
+            values = _map_column(path, name, "int64", length)
+            data[name] = values.view("datetime64[ns]")
+
+        elif column["kind"] == "numeric":
+            data[name] = _map_column(path, name, column["dtype"], length)
+
+        else:
+            with open(
+                os.path.join(path, f"{name}.categories.json"), encoding="utf-8"
+            ) as file:
+                categories = json.load(file)
+
+            codes = _map_column(path, name, column["dtype"], length)
+            data[name] = pd.Categorical.from_codes(
+                codes, categories=categories, validate=False
+            )
+
+    return pd.DataFrame(data, copy=False)
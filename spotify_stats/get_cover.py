@@ -1,6 +1,29 @@
+import html
+import re
+
 import requests
 import spotipy
 from PIL import Image
+from spotipy.oauth2 import SpotifyOauthError
+
+# shown until the actual image is loaded or if it is not available
+PLACEHOLDER_IMAGE = "/static/placeholder.svg"
+
+# placeholder images in html (see get_cover_placeholder() and
+# get_artist_image_placeholder())
+TRACK_PLACEHOLDER = re.compile(
+    f"<img src='{PLACEHOLDER_IMAGE}' data-track-uri='([^']*)'>"
+)
+ARTIST_PLACEHOLDER = re.compile(
+    f"<img src='{PLACEHOLDER_IMAGE}' data-artist='([^']*)'>"
+)
+
+# failed requests to the Spotify Web API
+REQUEST_ERRORS = (
+    spotipy.SpotifyException,
+    SpotifyOauthError,
+    requests.RequestException,
+)
 
 
 def get_cover_image(
@@ -64,3 +87,115 @@ def get_artist_image(
     image_url = "<img src='" + image_url + "'>"
 
     return image_url
+
+
+def get_cover_placeholder(track_uri: str) -> str:
+    """
+    Placeholder image for a cover which is loaded later on
+    (see get_cover_urls()). The track URI is stored in the html tag.
+    """
+
+    return (
+        f"<img src='{PLACEHOLDER_IMAGE}' "
+        f"data-track-uri='{html.escape(track_uri, quote=True)}'>"
+    )
+
+
+def get_artist_image_placeholder(artist: str) -> str:
+    """
+    Placeholder image for an artist image which is loaded later on
+    (see get_artist_image_urls()). The artist is stored in the html tag.
+    """
+
+    return (
+        f"<img src='{PLACEHOLDER_IMAGE}' "
+        f"data-artist='{html.escape(artist, quote=True)}'>"
+    )
+
+
+def get_cover_urls(
+    track_uris: list[str], spotify_credentials: spotipy.client.Spotify
+) -> dict[str, str | None]:
+    """
+    Get links to the covers of several tracks with as few requests as
+    possible (50 tracks per request). Tracks without a cover or for
+    which the request failed are mapped to None.
+    """
+
+    cover_urls = {track_uri: None for track_uri in track_uris}
+
+    for i in range(0, len(track_uris), 50):
+        chunk = track_uris[i : i + 50]
+
+        try:
+            tracks = spotify_credentials.tracks(chunk)["tracks"]
+        except REQUEST_ERRORS:
+            continue
+
+        for track_uri, track in zip(chunk, tracks):
+            try:
+                # url to smaller cover
+                cover_urls[track_uri] = track["album"]["images"][1]["url"]
+            except (TypeError, KeyError, IndexError):
+                pass
+
+    return cover_urls
+
+
+def get_artist_image_urls(
+    artists: list[str], spotify_credentials: spotipy.client.Spotify
+) -> dict[str, str | None]:
+    """
+    Get links to the images of several artists. Artists which could not
+    be found or for which the request failed are mapped to None.
+    """
+
+    image_urls = {}
+
+    for artist in artists:
+        try:
+            result = spotify_credentials.search(artist, limit=1, type="artist")
+            images = result["artists"]["items"][0]["images"]
+            image_urls[artist] = images[1]["url"]
+        except (*REQUEST_ERRORS, KeyError, IndexError):
+            image_urls[artist] = None
+
+    return image_urls
+
+
+def resolve_placeholders(
+    html_page: str, spotify_credentials: spotipy.client.Spotify
+) -> str:
+    """
+    Replace the placeholder images of a html page with the actual covers
+    and artist images, e.g. to prerender a page. Placeholders which can
+    not be resolved are kept (without the information to load them).
+    """
+
+    track_uris = [
+        html.unescape(uri) for uri in TRACK_PLACEHOLDER.findall(html_page)
+    ]
+    artists = [
+        html.unescape(artist)
+        for artist in ARTIST_PLACEHOLDER.findall(html_page)
+    ]
+
+    cover_urls = get_cover_urls(
+        list(dict.fromkeys(track_uris)), spotify_credentials
+    )
+    image_urls = get_artist_image_urls(
+        list(dict.fromkeys(artists)), spotify_credentials
+    )
+
+    def replace(match: re.Match, urls: dict[str, str | None]) -> str:
+        url = urls.get(html.unescape(match.group(1)))
+        return f"<img src='{url or PLACEHOLDER_IMAGE}'>"
+
+    html_page = TRACK_PLACEHOLDER.sub(
+        lambda match: replace(match, cover_urls), html_page
+    )
+    html_page = ARTIST_PLACEHOLDER.sub(
+        lambda match: replace(match, image_urls), html_page
+    )
+
+    return html_page
@@ -2,6 +2,27 @@ from os import listdir
 
 import pandas as pd
 
+# columns kept for music tracks
+MUSIC_COLUMNS = [
+    "ts",
+    "master_metadata_track_name",
+    "master_metadata_album_album_name",
+    "master_metadata_album_artist_name",
+    "spotify_track_uri",
+    "reason_end",
+    "minutes_played",
+]
+
+# columns kept for podcast episodes
+PODCAST_COLUMNS = [
+    "ts",
+    "episode_name",
+    "episode_show_name",
+    "spotify_episode_uri",
+    "reason_end",
+    "minutes_played",
+]
+
 
 def get_streams(path: str) -> pd.DataFrame:
     """
@@ -31,3 +52,65 @@ def get_streams(path: str) -> pd.DataFrame:
     df["minutes_played"] = df.seconds_played / 60
 
     return df
+
+
+def compact_streams(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """
+    Only keep the given columns and store them in a compact form.
+    Strings are stored as categoricals, timestamps as datetimes
+    (UTC) and minutes played as float32.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with a spotify streaming history
+
+    columns: list of columns to keep
+    """
+
+    df = df[columns].copy()
+
+    for column in columns:
+        if column == "ts":
+            # timestamps in UTC
+            df[column] = pd.to_datetime(df[column], utc=True).dt.tz_localize(
+                None
+            )
+        elif column == "minutes_played":
+            df[column] = df[column].astype("float32")
+        else:
+            df[column] = df[column].astype("category")
+
+    return df.reset_index(drop=True)
+
+
+def split_streams(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split a streaming history into a music and a podcast table.
+    Music entries have the 'master_metadata_*' fields set, podcast
+    entries the 'episode_*' fields. Each table only keeps its
+    relevant columns (see MUSIC_COLUMNS and PODCAST_COLUMNS).
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with a spotify streaming history,
+        e.g. returned by get_streams()
+
+    Example:
+    -------
+
+    >>> df = pd.read_csv("streaming_history.csv")
+    >>> music, podcasts = split_streams(df)
+    """
+
+    if "minutes_played" not in df.columns:
+        df = df.assign(minutes_played=df.ms_played / 1000 / 60)
+
+    music = compact_streams(
+        df[df["master_metadata_track_name"].notna()], MUSIC_COLUMNS
+    )
+
+    podcasts = compact_streams(df[df["episode_name"].notna()], PODCAST_COLUMNS)
+
+    return music, podcasts
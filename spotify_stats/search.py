@@ -0,0 +1,274 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from spotify_stats.entities import ENTITY_COLUMNS, get_entity_codes
+
+# name column of each kind of entity
+NAME_COLUMNS = {"artist": "Artist", "album": "Album", "track": "Track"}
+
+# kinds of entities, SearchIndex.kinds holds positions in this list
+KINDS = list(ENTITY_COLUMNS)
+
+# search keys are stored as utf-8 bytes cut to this length, longer
+# queries are checked against the whole name
+KEY_BYTES = 24
+
+
+class SearchIndex(NamedTuple):
+    """
+    Sorted search keys (lowercase names and the words they contain)
+    and the entity each key belongs to, together with precomputed stats
+    of every artist, album and track.
+    """
+
+    # sorted utf-8 keys, cut to KEY_BYTES
+    keys: np.ndarray
+    # kind (position in KINDS), code, first word and number of plays of
+    # the entity of each key
+    kinds: np.ndarray
+    codes: np.ndarray
+    words: np.ndarray
+    plays: np.ndarray
+    # names of the entities by kind (row i belongs to code i)
+    labels: dict[str, pd.DataFrame]
+    # plays, skips, hours, first and last played by kind and code
+    stats: dict[str, pd.DataFrame]
+    # plays and hours per month by kind, sorted by code
+    monthly: dict[str, pd.DataFrame]
+
+
+def _search_keys(name: str) -> list[str]:
+    """
+    Search keys of a name: the whole name and the rest of the name from
+    each word on, e.g. 'The Beatles' -> ['the beatles', 'beatles'].
+    """
+
+    words = name.casefold().split()
+
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def build_search_index(df: pd.DataFrame) -> SearchIndex:
+    """
+    Build a search index over all artist, album and track names of a
+    streaming history and precompute the stats of every artist, album
+    and track: number of plays and skips, hours listened, first and last
+    time played as well as plays and hours per month.
+
+    The keys are kept in a sorted numpy array, a search is a binary
+    search (see search()).
+
+    Like in the stats functions, a stream counts as play if the whole
+    song was played and as skip otherwise. Hours listened include
+    skipped streams.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the music part of a spotify streaming
+        history (see split_streams())
+
+    Example:
+    -------
+
+    >>> index = build_search_index(music)
+    >>> search(index, "beat", limit=2)
+    [{'kind': 'artist', 'code': 12, 'name': 'The Beatles', ...}, ...]
+    """
+
+    ts = pd.to_datetime(df["ts"]).to_numpy()
+    months = ts.astype("datetime64[M]")
+    whole_played = (df["reason_end"] == "trackdone").to_numpy()
+    minutes = df["minutes_played"].to_numpy(dtype=np.float64)
+
+    keys, kinds, codes, words, plays = [], [], [], [], []
+    labels, stats, monthly = {}, {}, {}
+    for position, kind in enumerate(KINDS):
+        stream_codes, kind_labels = get_entity_codes(df, kind)
+        labels[kind] = kind_labels
+
+        streams = pd.DataFrame(
+            {
+                "code": stream_codes,
+                "month": months,
+                "ts": ts,
+                "plays": whole_played.astype(np.int64),
+                "skips": (~whole_played).astype(np.int64),
+                "hours": minutes / 60,
+            }
+        )
+        streams = streams[streams["code"] >= 0]
+
+        stats[kind] = (
+            streams.groupby("code")
+            .agg(
+                plays=("plays", "sum"),
+                skips=("skips", "sum"),
+                hours=("hours", "sum"),
+                first_played=("ts", "min"),
+                last_played=("ts", "max"),
+            )
+            .reindex(np.arange(len(kind_labels)))
+        )
+
+        monthly[kind] = (
+            streams.groupby(["code", "month"])[["plays", "hours"]]
+            .sum()
+            .reset_index()
+        )
+
+        # one key per word of each name
+        name_keys = [
+            _search_keys(name) for name in kind_labels[NAME_COLUMNS[kind]]
+        ]
+        n_keys = np.array([len(k) for k in name_keys], dtype=np.int64)
+        offsets = np.repeat(np.cumsum(n_keys) - n_keys, n_keys)
+
+        keys.append(
+            np.array(
+                [
+                    key.encode()[:KEY_BYTES]
+                    for name in name_keys
+                    for key in name
+                ],
+                dtype=f"S{KEY_BYTES}",
+            )
+        )
+        kinds.append(np.full(n_keys.sum(), position, dtype=np.int8))
+        codes.append(np.repeat(np.arange(len(n_keys), dtype=np.int32), n_keys))
+        words.append((np.arange(n_keys.sum()) - offsets).astype(np.int16))
+        plays.append(
+            np.repeat(stats[kind]["plays"].to_numpy(dtype=np.int64), n_keys)
+        )
+
+    keys = np.concatenate(keys)
+    order = np.argsort(keys, kind="stable")
+
+    return SearchIndex(
+        keys=keys[order],
+        kinds=np.concatenate(kinds)[order],
+        codes=np.concatenate(codes)[order],
+        words=np.concatenate(words)[order],
+        plays=np.concatenate(plays)[order],
+        labels=labels,
+        stats=stats,
+        monthly=monthly,
+    )
+
+
+def search(index: SearchIndex, query: str, limit: int = 10) -> list[dict]:
+    """
+    Find the artists, albums and tracks whose name (or a word of it)
+    starts with the query. The matches are found by binary search on
+    the sorted keys and ranked by number of plays.
+
+    Arguments:
+    ---------
+
+    index: search index (see build_search_index())
+
+    query: beginning of the name
+
+    limit: maximum number of results
+
+    Example:
+    -------
+
+    >>> search(index, "beat", limit=1)
+    [{'kind': 'artist', 'code': 12, 'name': 'The Beatles',
+      'artist': 'The Beatles', 'plays': 1024}]
+    """
+
+    prefix = " ".join(query.casefold().split())
+    if not prefix:
+        return []
+
+    encoded = prefix.encode()
+    start = np.searchsorted(index.keys, encoded[:KEY_BYTES], side="left")
+    if len(encoded) < KEY_BYTES:
+        # 0xff does not occur in utf-8, i.e. is larger than every key
+        # starting with the prefix
+        end = np.searchsorted(index.keys, encoded + b"\xff", side="left")
+    else:
+        end = np.searchsorted(index.keys, encoded[:KEY_BYTES], side="right")
+
+    results = []
+    seen = set()
+    # most played first
+    for i in start + np.argsort(-index.plays[start:end], kind="stable"):
+        kind, code = KINDS[index.kinds[i]], int(index.codes[i])
+
+        # several keys (words) can belong to the same entity
+        if (kind, code) in seen:
+            continue
+
+        label = index.labels[kind].iloc[code]
+        name = label[NAME_COLUMNS[kind]]
+
+        # the keys are cut, compare the whole key
+        if len(encoded) > KEY_BYTES and not _search_keys(name)[
+            index.words[i]
+        ].startswith(prefix):
+            continue
+        seen.add((kind, code))
+
+        results.append(
+            {
+                "kind": kind,
+                "code": code,
+                "name": name,
+                "artist": label["Artist"],
+                "plays": int(index.plays[i]),
+            }
+        )
+
+        if len(results) == limit:
+            break
+
+    return results
+
+
+def get_entity_stats(
+    index: SearchIndex, kind: str, code: int
+) -> tuple[pd.Series, pd.DataFrame]:
+    """
+    Get the precomputed stats of an artist, album or track: its names,
+    number of plays and skips, hours listened, first and last time
+    played as well as plays and hours per month (from the first to the
+    last month played, months without streams are 0).
+
+    Arguments:
+    ---------
+
+    index: search index (see build_search_index())
+
+    kind: 'artist', 'album' or 'track'
+
+    code: code of the entity (see search())
+    """
+
+    stats = pd.concat(
+        [index.labels[kind].iloc[code], index.stats[kind].iloc[code]]
+    )
+
+    # the monthly series is sorted by code
+    monthly = index.monthly[kind]
+    start, end = monthly["code"].searchsorted([code, code + 1])
+    monthly = monthly.iloc[start:end].drop(columns=["code"])
+
+    # only months with streams are stored, fill the gaps in between with
+    # 0 to get a continuous series
+    months = pd.date_range(
+        monthly["month"].iloc[0], monthly["month"].iloc[-1], freq="MS"
+    )
+    monthly = (
+        monthly.set_index("month")
+        .reindex(months, fill_value=0)
+        .rename_axis("month")
+        .reset_index()
+    )
+    monthly["month"] = monthly["month"].dt.strftime("%Y-%m")
+
+    return stats, monthly.reset_index(drop=True)
@@ -0,0 +1,182 @@
+import functools
+import threading
+import time
+from collections.abc import Callable
+
+from flask import Response, current_app, make_response, request
+from flask_caching import Cache
+
+from spotify_stats.compression import choose_encoding, compress_variants
+
+# computations in progress by cache key
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    """
+    A computation in progress, other callers wait for its result.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+def _to_entry(rv, timeout: int) -> dict:
+    """
+    Convert the return value of a view to a cache entry.
+    """
+
+    response = make_response(rv)
+    body = response.get_data()
+
+    return {
+        "body": body,
+        # compressed once per cache fill
+        "encodings": compress_variants(body, response.mimetype),
+        "status": response.status_code,
+        "headers": [
+            (name, value)
+            for name, value in response.headers.items()
+            if name != "Content-Length"
+        ],
+        "expires": time.time() + timeout,
+    }
+
+
+def _from_entry(entry: dict) -> Response:
+    """
+    Build a response from a cache entry, compressed according to the
+    'Accept-Encoding' header of the request.
+    """
+
+    response = Response(status=entry["status"], headers=entry["headers"])
+
+    if not entry["encodings"]:
+        response.set_data(entry["body"])
+        return response
+
+    encoding = choose_encoding(
+        request.headers.get("Accept-Encoding", ""), list(entry["encodings"])
+    )
+
+    if encoding is None:
+        response.set_data(entry["body"])
+    else:
+        response.set_data(entry["encodings"][encoding])
+        response.headers["Content-Encoding"] = encoding
+
+    # the body depends on the 'Accept-Encoding' header
+    response.vary.add("Accept-Encoding")
+
+    return response
+
+
+def _compute(key: str, compute: Callable[[], dict]) -> _Flight:
+    """
+    Run compute() for a cache key unless a computation of the key is
+    already in progress. Either way, return the flight to wait for.
+    """
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight
+        flight = _flights[key] = _Flight()
+
+    try:
+        flight.entry = compute()
+    except Exception as error:
+        flight.error = error
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+    return flight
+
+
+def single_flight_cached(
+    cache: Cache, query_string: bool = False
+) -> Callable[[Callable], Callable]:
+    """
+    Cache the response of a flask view like 'cache.cached()', but
+
+    - compute the response only once per cache key: concurrent requests
+      of an expired or missing entry wait for the running computation
+      instead of repeating it (single-flight)
+
+    - serve expired entries for another 'CACHE_STALE_TIMEOUT' seconds
+      while the entry is refreshed in a background thread
+      (stale-while-revalidate)
+
+    Entries are fresh for 'CACHE_DEFAULT_TIMEOUT' seconds. Both timeouts
+    are read from the app config. Entries are stored together with
+    gzip (and brotli) compressed bodies, which are sent according to
+    the 'Accept-Encoding' header of the request.
+
+    Computations are coalesced within a process, each worker process
+    computes an entry at most once.
+
+    Arguments:
+    ---------
+
+    cache: flask-caching cache to store the responses
+
+    query_string: if true -> the query string is part of the cache key
+
+    Example:
+    -------
+
+    >>> @app.route("/top-songs")
+    >>> @single_flight_cached(cache)
+    >>> def display_top_songs():
+    >>>     ...
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            timeout = app.config.get("CACHE_DEFAULT_TIMEOUT", 300)
+            stale_timeout = app.config.get("CACHE_STALE_TIMEOUT", 0)
+
+            path = request.full_path if query_string else request.path
+            key = f"single_flight/{view.__name__}/{path}"
+
+            def compute() -> dict:
+                entry = _to_entry(view(*args, **kwargs), timeout)
+                if entry["status"] == 200:
+                    cache.set(key, entry, timeout=timeout + stale_timeout)
+                return entry
+
+            def refresh() -> None:
+                # the view needs a request context
+                with app.test_request_context(path):
+                    flight = _compute(key, compute)
+                    if flight.error is not None:
+                        app.logger.error(
+                            f"Refreshing {path} failed", exc_info=flight.error
+                        )
+
+            entry = cache.get(key)
+
+            if entry is not None:
+                if entry["expires"] < time.time() and key not in _flights:
+                    # serve the stale entry and refresh it meanwhile
+                    threading.Thread(target=refresh, daemon=True).start()
+                return _from_entry(entry)
+
+            flight = _compute(key, compute)
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return _from_entry(flight.entry)
+
+        return wrapper
+
+    return decorator
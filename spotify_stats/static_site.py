@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections.abc import Callable, Iterable
+
+import requests
+from flask import Flask
+
+from spotify_stats.compression import compress_variants
+
+# name of the file which stores the fingerprints of the built pages
+MANIFEST_NAME = ".build-manifest.json"
+
+# folder (within the output directory) for downloaded images
+IMAGE_DIR = "covers"
+
+# remote images referenced in the html of a page
+IMAGE_PATTERN = re.compile(r"""(<img[^>]*?\ssrc=)(['"])(https?://[^'"]+)\2""")
+
+IMAGE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png"}
+
+# links to other pages of the app
+LINK_PATTERN = re.compile(
+    r"""<a\s[^>]*?href=(['"])(/[^'"]*)\1[^>]*>(.*?)</a>""", re.DOTALL
+)
+
+# file extensions of precompressed pages by content encoding
+ENCODING_EXTENSIONS = {"gzip": ".gz", "br": ".br"}
+
+
+def _hash_path(digest, path: str) -> None:
+    """
+    Update a digest with the content of a file or all files of a folder.
+    """
+
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            # walk in a stable order
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                _hash_path(digest, os.path.join(root, name))
+        return
+
+    digest.update(path.encode())
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def hash_inputs(inputs: Iterable[str]) -> str:
+    """
+    Hash the content of files or folders, missing ones are skipped.
+
+    Arguments:
+    ---------
+
+    inputs: files or folders
+    """
+
+    digest = hashlib.sha256()
+    for path in sorted(inputs):
+        if os.path.exists(path):
+            _hash_path(digest, path)
+
+    return digest.hexdigest()
+
+
+def get_fingerprint(url: str, input_hashes: Iterable[str]) -> str:
+    """
+    Fingerprint of a page, changes as soon as one of its inputs changes.
+
+    Arguments:
+    ---------
+
+    url: url of the page
+
+    input_hashes: hashes of the inputs the page is built from
+        (see hash_inputs())
+    """
+
+    digest = hashlib.sha256(url.encode())
+    for input_hash in input_hashes:
+        digest.update(input_hash.encode())
+
+    return digest.hexdigest()
+
+
+def get_output_path(url: str, mimetype: str) -> str:
+    """
+    Relative file path of a page in the static site. HTML pages are
+    written to '<url>/index.html' to be served without extension, any
+    other payload (e.g. JSON) is written as is.
+    """
+
+    path = url.strip("/")
+
+    if mimetype == "text/html":
+        return os.path.join(path, "index.html")
+
+    return path
+
+
+def remove_dead_links(html: str, urls: set[str], static_url: str) -> str:
+    """
+    Replace links to pages which are not part of the static site with
+    their text.
+
+    Arguments:
+    ---------
+
+    html: the html of a page
+
+    urls: urls of all pages of the static site
+
+    static_url: url path of the static files, e.g. '/static'
+    """
+
+    def unlink(match: re.Match) -> str:
+        url = match.group(2).split("?")[0].split("#")[0]
+        if url in urls or url.startswith(static_url.rstrip("/") + "/"):
+            return match.group(0)
+        return match.group(3)
+
+    return LINK_PATTERN.sub(unlink, html)
+
+
+def download_images(html: str, out_dir: str) -> str:
+    """
+    Download all remote images (e.g. album covers) of a html page to the
+    static site and point the page to the local copies. Images which
+    were already downloaded are reused, images which can not be
+    downloaded keep their remote URL.
+
+    Arguments:
+    ---------
+
+    html: the html of a page
+
+    out_dir: output directory of the static site
+    """
+
+    image_dir = os.path.join(out_dir, IMAGE_DIR)
+    os.makedirs(image_dir, exist_ok=True)
+
+    def localize(match: re.Match) -> str:
+        tag, quote, url = match.groups()
+        name = hashlib.sha1(url.encode()).hexdigest()[:20]
+
+        # image was downloaded during a previous build
+        for file in os.listdir(image_dir):
+            if file.startswith(name):
+                return f"{tag}{quote}/{IMAGE_DIR}/{file}{quote}"
+
+        try:
+            response = requests.get(url, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException:
+            return match.group(0)
+
+        content_type = response.headers.get("Content-Type", "")
+        file = name + IMAGE_EXTENSIONS.get(content_type.split(";")[0], "")
+
+        with open(os.path.join(image_dir, file), "wb") as image:
+            image.write(response.content)
+
+        return f"{tag}{quote}/{IMAGE_DIR}/{file}{quote}"
+
+    return IMAGE_PATTERN.sub(localize, html)
+
+
+def build_static_site(
+    app: Flask,
+    out_dir: str,
+    inputs: list[str],
+    page_inputs: dict[str, list[str]] | None = None,
+    url_values: dict[str, Callable[[], Iterable[dict]]] | None = None,
+    process_html: Callable[[str], str] | None = None,
+    exclude: Iterable[str] = (),
+    force: bool = False,
+) -> list[str]:
+    """
+    Prerender every route of a flask app into a static site which can be
+    served by any web server (e.g. nginx). Each page is requested once,
+    remote images are downloaded and the result is written to the
+    output directory together with the static files of the app and
+    gzip (and brotli) compressed copies of each page.
+
+    Links to pages of the app which are not built are replaced by their
+    text. A page is only rendered again if its inputs (or the set of
+    pages) changed since the last build and only written again (images
+    downloaded, compressed) if the rendered page changed. Returns the
+    URLs of the written pages.
+
+    Arguments:
+    ---------
+
+    app: the flask app
+
+    out_dir: output directory of the static site
+
+    inputs: files or folders every page depends on (e.g. the streaming
+        history and the source code)
+
+    page_inputs: additional inputs of single pages by endpoint name
+        (e.g. templates)
+
+    url_values: for routes with variables (e.g. '/wrapped/<year>'),
+        a function by endpoint name returning the values of all pages
+        to build
+
+    process_html: function applied to the html of every page before
+        its images are downloaded (e.g. to resolve placeholder images)
+
+    exclude: endpoint names of routes which are not built (e.g. health
+        checks)
+
+    force: if true -> rebuild every page
+
+    Example:
+    -------
+
+    >>> build_static_site(
+            app, "site", inputs=["streaming_history.csv", "app.py"]
+        )
+    ['/', '/top-songs', '/top-albums', ...]
+    """
+
+    page_inputs = page_inputs or {}
+    url_values = url_values or {}
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    # static files (css, ...)
+    if app.static_folder is not None and os.path.isdir(app.static_folder):
+        shutil.copytree(
+            app.static_folder,
+            os.path.join(out_dir, app.static_url_path.strip("/")),
+            dirs_exist_ok=True,
+        )
+
+    # every input is hashed once per build, not once per page
+    inputs_hash = hash_inputs(inputs)
+    page_input_hashes = {
+        endpoint: hash_inputs(paths) for endpoint, paths in page_inputs.items()
+    }
+
+    adapter = app.url_map.bind("localhost")
+    client = app.test_client()
+
+    pages = []
+    for rule in app.url_map.iter_rules():
+        if (
+            rule.endpoint == "static"
+            or rule.endpoint in exclude
+            or "GET" not in rule.methods
+        ):
+            continue
+
+        if rule.arguments:
+            if rule.endpoint not in url_values:
+                # no way to know which pages exist
+                continue
+            values = url_values[rule.endpoint]()
+        else:
+            values = [{}]
+
+        for value in values:
+            pages.append((rule.endpoint, adapter.build(rule.endpoint, value)))
+
+    # links to pages which are not built are removed, pages have to be
+    # rebuilt if the set of pages changes
+    urls = {url for _, url in pages}
+    urls_hash = hashlib.sha256("\n".join(sorted(urls)).encode()).hexdigest()
+
+    new_manifest = {}
+    built = []
+    for endpoint, url in pages:
+        fingerprint = get_fingerprint(
+            url,
+            [inputs_hash, page_input_hashes.get(endpoint, ""), urls_hash],
+        )
+
+        page = manifest.get(url)
+        if (
+            page is not None
+            and page["fingerprint"] == fingerprint
+            and os.path.exists(os.path.join(out_dir, page["path"]))
+        ):
+            new_manifest[url] = page
+            continue
+
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Could not build {url}: status {response.status_code}"
+            )
+
+        path = get_output_path(url, response.mimetype)
+        body = response.get_data()
+        if response.mimetype == "text/html":
+            body = remove_dead_links(
+                body.decode(), urls, app.static_url_path
+            ).encode()
+
+        # the page was rendered again, but did not change -> the images,
+        # files and compressed variants of the last build are kept
+        content = hashlib.sha256(body).hexdigest()
+        if (
+            page is not None
+            and page.get("content") == content
+            and page["path"] == path
+            and os.path.exists(os.path.join(out_dir, path))
+        ):
+            new_manifest[url] = {**page, "fingerprint": fingerprint}
+            continue
+
+        if response.mimetype == "text/html":
+            html = body.decode()
+            if process_html is not None:
+                html = process_html(html)
+            body = download_images(html, out_dir).encode()
+
+        os.makedirs(
+            os.path.dirname(os.path.join(out_dir, path)), exist_ok=True
+        )
+        with open(os.path.join(out_dir, path), "wb") as file:
+            file.write(body)
+
+        # precompressed variants, e.g. for 'gzip_static' of nginx
+        variants = compress_variants(body, response.mimetype)
+        for encoding, extension in ENCODING_EXTENSIONS.items():
+            variant_path = os.path.join(out_dir, path + extension)
+            if encoding in variants:
+                with open(variant_path, "wb") as file:
+                    file.write(variants[encoding])
+            elif os.path.exists(variant_path):
+                os.remove(variant_path)
+
+        new_manifest[url] = {
+            "fingerprint": fingerprint,
+            "content": content,
+            "path": path,
+        }
+        built.append(url)
+
+    # remove pages which no longer exist
+    for url, page in manifest.items():
+        if url not in new_manifest:
+            old_path = os.path.join(out_dir, page["path"])
+            for extension in ["", *ENCODING_EXTENSIONS.values()]:
+                if os.path.exists(old_path + extension):
+                    os.remove(old_path + extension)
+
+    with open(manifest_path, "w") as file:
+        json.dump(new_manifest, file, indent=2)
+
+    return built
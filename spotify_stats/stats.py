@@ -4,7 +4,15 @@ import plotly.express as px
 import spotipy
 from plotly.graph_objects import Figure
 
-from spotify_stats.get_cover import get_artist_image, get_cover_url
+from spotify_stats.get_cover import (
+    get_artist_image,
+    get_artist_image_placeholder,
+    get_cover_placeholder,
+    get_cover_url,
+)
+
+# resolutions of get_hours_listened() and their pandas frequency
+FREQUENCIES = {"hour": "h", "day": "D", "week": "W-MON", "month": "MS"}
 
 
 def check_whole_song_played(df: pd.DataFrame) -> pd.DataFrame:
@@ -18,6 +26,9 @@ def check_whole_song_played(df: pd.DataFrame) -> pd.DataFrame:
     df: a pandas data frame with a spotify streaming history
     """
 
+    # the new column is added to a shallow copy, the data frame passed
+    # in is not changed (it is shared between requests and workers)
+    df = df.copy(deep=False)
     df["whole_played"] = np.where(df.reason_end == "trackdone", 1, 0)
 
     return df
@@ -46,6 +57,7 @@ def get_top_albums(
     top: int | None = 20,
     spotify_credentials: spotipy.client.Spotify | None = None,
     cover: bool = False,
+    deferred: bool = False,
 ) -> pd.DataFrame | str:
     """
     Returns the top albums determined by the count of number of songs
@@ -69,6 +81,10 @@ def get_top_albums(
 
     cover: if true -> append the track uri
 
+    deferred: if true -> add placeholder images instead of the covers,
+        which are loaded afterwards (see get_cover_urls()). No spotify
+        credentials are needed.
+
     Example:
     -------
 
@@ -96,12 +112,18 @@ def get_top_albums(
         df = df[df["whole_played"] == 1]
 
     # count how often is a song played of a certain album
-    top_albums = df.value_counts(
-        subset=[
-            "master_metadata_album_album_name",
-            "master_metadata_album_artist_name",
-        ]
-    ).reset_index(name="n_songs_album")
+    top_albums = (
+        df.groupby(
+            [
+                "master_metadata_album_album_name",
+                "master_metadata_album_artist_name",
+            ],
+            observed=True,
+        )
+        .size()
+        .sort_values(ascending=False)
+        .reset_index(name="n_songs_album")
+    )
 
     # subset df
     df = df[
@@ -135,7 +157,13 @@ def get_top_albums(
     if top is not None:
         top_albums = top_albums.nlargest(n=top, columns=["n_songs_album"])
 
-    if cover and spotify_credentials is not None:
+    if cover and deferred:
+        # covers are loaded later on
+        top_albums["Cover"] = [
+            get_cover_placeholder(track_uri)
+            for track_uri in top_albums["spotify_track_uri"]
+        ]
+    elif cover and spotify_credentials is not None:
         # spotify client credentials must be given
         top_albums["Cover"] = [
             get_cover_url(track_uri, spotify_credentials)
@@ -181,6 +209,7 @@ def get_top_artists(
     top: int | None = 20,
     spotify_credentials: spotipy.client.Spotify | None = None,
     artist_image: bool = False,
+    deferred: bool = False,
 ) -> pd.DataFrame:
     """
     Retrieve top artists based on hours listened to.
@@ -200,6 +229,10 @@ def get_top_artists(
 
     artist_image: if true -> add url to image of artist
 
+    deferred: if true -> add placeholder images instead of the artist
+        images, which are loaded afterwards (see get_artist_image_urls()).
+        No spotify credentials are needed.
+
     Example:
     -------
     >>> from spotipy.oauth2 import SpotifyClientCredentials
@@ -230,7 +263,9 @@ def get_top_artists(
 
     # calculate sum of hours listened to artists
     top_artists = (
-        df.groupby(["master_metadata_album_artist_name"])["minutes_played"]
+        df.groupby(["master_metadata_album_artist_name"], observed=True)[
+            "minutes_played"
+        ]
         .sum()
         .reset_index()
     )
@@ -254,7 +289,13 @@ def get_top_artists(
     )
 
     # retrieve image of artists
-    if artist_image and spotify_credentials is not None:
+    if artist_image and deferred:
+        # artist images are loaded later on
+        top_artists["Image"] = [
+            get_artist_image_placeholder(artist)
+            for artist in top_artists["Artist"]
+        ]
+    elif artist_image and spotify_credentials is not None:
         # spotify client credentials must be given
         top_artists["Image"] = [
             get_artist_image(artist, spotify_credentials)
@@ -286,6 +327,7 @@ def get_top_songs(
     top: int | None = 20,
     spotify_credentials: spotipy.client.Spotify | None = None,
     cover: bool = False,
+    deferred: bool = False,
 ) -> pd.DataFrame:
     """
     Get most played songs.
@@ -308,6 +350,10 @@ def get_top_songs(
 
     cover: if true -> append the track uri
 
+    deferred: if true -> add placeholder images instead of the covers,
+        which are loaded afterwards (see get_cover_urls()). No spotify
+        credentials are needed.
+
     Example:
     -------
     >>> from spotipy.oauth2 import SpotifyClientCredentials
@@ -340,13 +386,19 @@ def get_top_songs(
 
     if frequency:
         # count the number a song was played by specific track, album and artist name
-        top_songs = df.value_counts(
-            subset=[
-                "master_metadata_track_name",
-                "master_metadata_album_album_name",
-                "master_metadata_album_artist_name",
-            ]
-        ).reset_index(name="n_played")
+        top_songs = (
+            df.groupby(
+                [
+                    "master_metadata_track_name",
+                    "master_metadata_album_album_name",
+                    "master_metadata_album_artist_name",
+                ],
+                observed=True,
+            )
+            .size()
+            .sort_values(ascending=False)
+            .reset_index(name="n_played")
+        )
 
     if frequency is False:
         # calculate sum of hours listened to song
@@ -356,7 +408,8 @@ def get_top_songs(
                     "master_metadata_track_name",
                     "master_metadata_album_album_name",
                     "master_metadata_album_artist_name",
-                ]
+                ],
+                observed=True,
             )["minutes_played"]
             .sum()
             .reset_index()
@@ -411,7 +464,13 @@ def get_top_songs(
         if frequency is False:
             top_songs = top_songs.nlargest(n=top, columns=["Hours played"])
 
-    if cover and spotify_credentials is not None:
+    if cover and deferred:
+        # covers are loaded later on
+        top_songs["Cover"] = [
+            get_cover_placeholder(track_uri)
+            for track_uri in top_songs["spotify_track_uri"]
+        ]
+    elif cover and spotify_credentials is not None:
         # spotify client credentials must be given
         top_songs["Cover"] = [
             get_cover_url(track_uri, spotify_credentials)
@@ -461,6 +520,7 @@ def get_top_skipped_songs(
     top: int | None = 20,
     spotify_credentials: spotipy.client.Spotify | None = None,
     cover: bool = False,
+    deferred: bool = False,
 ) -> pd.DataFrame:
     """
     Get most skipped songs.
@@ -477,6 +537,10 @@ def get_top_skipped_songs(
 
     cover: if true -> append the track uri
 
+    deferred: if true -> add placeholder images instead of the covers,
+        which are loaded afterwards (see get_cover_urls()). No spotify
+        credentials are needed.
+
     Example:
     -------
 
@@ -507,13 +571,19 @@ def get_top_skipped_songs(
     df = df[df["whole_played"] == 0]
 
     # count the number a song was skipped by specific track, album and artist name
-    top_skipped_songs = df.value_counts(
-        subset=[
-            "master_metadata_track_name",
-            "master_metadata_album_album_name",
-            "master_metadata_album_artist_name",
-        ]
-    ).reset_index(name="n_skipped")
+    top_skipped_songs = (
+        df.groupby(
+            [
+                "master_metadata_track_name",
+                "master_metadata_album_album_name",
+                "master_metadata_album_artist_name",
+            ],
+            observed=True,
+        )
+        .size()
+        .sort_values(ascending=False)
+        .reset_index(name="n_skipped")
+    )
 
     # subset df
     df = df[
@@ -553,7 +623,13 @@ def get_top_skipped_songs(
             n=top, columns=["n_skipped"]
         )
 
-    if cover and spotify_credentials is not None:
+    if cover and deferred:
+        # covers are loaded later on
+        top_skipped_songs["Cover"] = [
+            get_cover_placeholder(track_uri)
+            for track_uri in top_skipped_songs["spotify_track_uri"]
+        ]
+    elif cover and spotify_credentials is not None:
         # spotify client credentials must be given
         top_skipped_songs["Cover"] = [
             get_cover_url(track_uri, spotify_credentials)
@@ -596,6 +672,134 @@ def get_top_skipped_songs(
     return top_skipped_songs
 
 
+def get_top_shows(
+    df: pd.DataFrame,
+    exclude_skipped: bool = False,
+    top: int | None = 20,
+) -> pd.DataFrame:
+    """
+    Retrieve top podcast shows based on hours listened to.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the podcast part of a spotify
+        streaming history (see split_streams())
+
+    exclude_skipped: if true -> only consider episodes which were
+        not skipped
+
+    top: int specifying the number of top shows
+
+    Example:
+    -------
+    >>> music, podcasts = split_streams(df)
+    >>> get_top_shows(podcasts, top=3)
+       Place  ... Hours listened
+    0      1  ...          86.12
+    1      2  ...          40.57
+    2      3  ...          12.09
+    [3 rows x 3 columns]
+    """
+
+    if exclude_skipped:
+        # only consider episodes which have been listened to entirely
+        df = check_whole_song_played(df)
+
+        df = df[df["whole_played"] == 1]
+
+    # calculate sum of hours listened to shows
+    top_shows = (
+        df.groupby(["episode_show_name"], observed=True)["minutes_played"]
+        .sum()
+        .reset_index()
+    )
+
+    # calculate hours
+    top_shows["Hours listened"] = [
+        round(float(show) / 60, 2) for show in top_shows["minutes_played"]
+    ]
+
+    top_shows = top_shows.drop(columns=["minutes_played"])
+
+    if top is not None:
+        top_shows = top_shows.nlargest(n=top, columns=["Hours listened"])
+
+    top_shows = top_shows.rename(columns={"episode_show_name": "Show"})
+
+    # new column "Place"
+    top_shows["Place"] = [i for i in range(1, len(top_shows) + 1)]
+
+    top_shows = top_shows.reindex(columns=["Place", "Show", "Hours listened"])
+
+    return top_shows
+
+
+def get_top_episodes(
+    df: pd.DataFrame,
+    exclude_skipped: bool = False,
+    top: int | None = 20,
+) -> pd.DataFrame:
+    """
+    Get most played podcast episodes.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the podcast part of a spotify
+        streaming history (see split_streams())
+
+    exclude_skipped: if true -> only consider episodes which were
+        not skipped
+
+    top: int specifying the number of top episodes
+
+    Example:
+    -------
+    >>> music, podcasts = split_streams(df)
+    >>> get_top_episodes(podcasts, top=3)
+       Place  ... Times played
+    0      1  ...            9
+    1      2  ...            7
+    2      3  ...            7
+    [3 rows x 4 columns]
+    """
+
+    if exclude_skipped:
+        # only consider episodes which have been listened to entirely
+        df = check_whole_song_played(df)
+
+        df = df[df["whole_played"] == 1]
+
+    # count the number an episode was played by episode and show name
+    top_episodes = (
+        df.groupby(["episode_name", "episode_show_name"], observed=True)
+        .size()
+        .sort_values(ascending=False)
+        .reset_index(name="n_played")
+    )
+
+    if top is not None:
+        top_episodes = top_episodes.nlargest(n=top, columns=["n_played"])
+
+    top_episodes = top_episodes.rename(
+        columns={
+            "episode_name": "Episode",
+            "episode_show_name": "Show",
+            "n_played": "Times played",
+        }
+    )
+
+    # new column "Place"
+    top_episodes["Place"] = [i for i in range(1, len(top_episodes) + 1)]
+
+    top_episodes = top_episodes.reindex(
+        columns=["Place", "Episode", "Show", "Times played"]
+    )
+
+    return top_episodes
+
+
 def get_chart_hours_listened(df: pd.DataFrame) -> Figure:
     """
     Get a plotly bar chart with the sum of hours listened to spotify
@@ -607,7 +811,8 @@ def get_chart_hours_listened(df: pd.DataFrame) -> Figure:
     df: a pandas data frame with a spotify streaming history
     """
 
-    # convert to datetime
+    # convert to datetime (in a shallow copy)
+    df = df.copy(deep=False)
     df["date"] = pd.to_datetime(df["ts"])
 
     # get Year-month
@@ -634,3 +839,44 @@ def get_chart_hours_listened(df: pd.DataFrame) -> Figure:
     fig.update_traces(marker_color="#16437E")
 
     return fig
+
+
+def get_hours_listened(df: pd.DataFrame, freq: str = "month") -> pd.Series:
+    """
+    Get the hours listened to spotify per hour, day, week or month as
+    time series. Periods without streams are included with 0 hours.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with a spotify streaming history
+
+    freq: resolution, one of 'hour', 'day', 'week' or 'month'
+
+    Example:
+    -------
+    >>> get_hours_listened(df, freq="month")
+    ts
+    2017-07-01    30.59
+    2017-08-01    41.22
+    2017-09-01    39.87
+                  ...
+    """
+
+    if freq not in FREQUENCIES:
+        raise ValueError(
+            f"freq must be one of {list(FREQUENCIES)}, got '{freq}'"
+        )
+
+    minutes = pd.Series(
+        df["minutes_played"].to_numpy(dtype="float64"),
+        index=pd.to_datetime(df["ts"]),
+    )
+
+    # sum up minutes for each period
+    hours = (
+        minutes.resample(FREQUENCIES[freq], closed="left", label="left").sum()
+        / 60
+    )
+
+    return hours
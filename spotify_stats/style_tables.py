@@ -1,11 +1,39 @@
 import pandas as pd
 
+# html page of the tables, the CSS file styles every table with class
+# 'mystyle'
+HTML_TEMPLATE = """
+    <html>
+      <head>
+      </head>
+      <link rel="stylesheet" type="text/css"
+            href="/static/pandas_table_style.css"/>
+      <script src="/static/covers.js" defer></script>
+      <body>
+        <h1>{table_heading}</h1>
+        {tables}
+      </body>
+    </html>
+    """
+
+
+def _to_html(data_frame: pd.DataFrame) -> str:
+    pd.set_option("colheader_justify", "center")
+
+    return data_frame.to_html(
+        # escape = False -> to 'render' links properly
+        classes="mystyle",
+        index=False,
+        escape=False,
+    )
+
 
 def style_pandas_html_table(
     data_frame: pd.DataFrame, table_heading: str
 ) -> str:
     """
-    Write pandas data frame to html and add a CSS file.
+    Write pandas data frame to html and add a CSS file. Placeholder
+    images (covers, artist images) are loaded by '/static/covers.js'.
 
     Arguments:
     ---------
@@ -14,28 +42,35 @@ def style_pandas_html_table(
     table_heading: Add a table heading.
     """
 
-    pd.set_option("colheader_justify", "center")
+    html = HTML_TEMPLATE.format(
+        table_heading=table_heading, tables=_to_html(data_frame)
+    )
 
-    html_string = """
-    <html>
-      <head>
-      </head>
-      <link rel="stylesheet" type="text/css" href="/static/pandas_table_style.css"/>
-      <body>
-        <h1>{table_heading}</h1>
-        {data_frame}
-      </body>
-    </html>.
+    return html
+
+
+def style_pandas_html_tables(
+    data_frames: dict[str, pd.DataFrame], table_heading: str
+) -> str:
+    """
+    Write several pandas data frames to a single html page and add a
+    CSS file. Each data frame gets its own sub-heading. Placeholder
+    images are loaded by '/static/covers.js'.
+
+    Arguments:
+    ---------
+    data_frames: Pandas data frames by sub-heading.
+
+    table_heading: Add a table heading.
     """
 
-    html = html_string.format(
-        table_heading=table_heading,
-        data_frame=data_frame.to_html(
-            # escape = False -> to 'render' links properly
-            classes="mystyle",
-            index=False,
-            escape=False,
-        ),
+    tables = [
+        f"<h2>{heading}</h2>\n{_to_html(data_frame)}"
+        for heading, data_frame in data_frames.items()
+    ]
+
+    html = HTML_TEMPLATE.format(
+        table_heading=table_heading, tables="\n".join(tables)
     )
 
     return html
@@ -0,0 +1,215 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from spotify_stats.entities import ENTITY_COLUMNS, NEW_NAMES
+from spotify_stats.get_streams import split_streams
+
+TRACK_COLUMNS = ENTITY_COLUMNS["track"]
+
+ALBUM_COLUMNS = ENTITY_COLUMNS["album"]
+
+ARTIST_COLUMNS = ENTITY_COLUMNS["artist"]
+
+PERIODS = {"year": "Year", "month": "Month"}
+
+
+def _top_per_period(
+    df: pd.DataFrame, period: str, metric: str, top: int | None
+) -> pd.DataFrame:
+    """
+    Select the top entries of each period by a metric and number them.
+    """
+
+    df = df[df[metric] > 0]
+
+    # sort by period first, then descending by the metric
+    df = df.sort_values(by=[period, metric], ascending=[True, False])
+
+    if top is not None:
+        df = df.groupby(period, observed=True).head(top)
+
+    df = df.reset_index(drop=True)
+
+    # new column "Place" (restarts for each period)
+    df.insert(1, "Place", df.groupby(period, observed=True).cumcount() + 1)
+
+    return df
+
+
+def get_wrapped_report(
+    df: pd.DataFrame, period: str = "year", top: int | None = 5
+) -> dict[str, pd.DataFrame]:
+    """
+    Compute the top songs, albums, artists and skipped songs for every
+    year (or month) of a streaming history at once.
+
+    The streaming history is aggregated a single time by period and
+    song. Albums and artists are derived from this (much smaller)
+    aggregate and the top entries are selected per period. Thus, a
+    report over 10 years costs about the same as one for a single year.
+
+    As in get_top_songs(), get_top_albums() and get_top_artists(),
+    skipped songs are not considered for the top songs, albums and
+    artists. Artists are ranked by hours listened.
+
+    Returns a dictionary with the keys 'songs', 'albums', 'artists' and
+    'skipped_songs' each holding a data frame with a 'Year' (or 'Month')
+    and a 'Place' column.
+
+    Arguments:
+    ---------
+
+    df: a pandas data frame with the music part of a spotify streaming
+        history (see split_streams())
+
+    period: 'year' or 'month'
+
+    top: int specifying the number of top entries per period
+
+    Example:
+    -------
+
+    >>> report = get_wrapped_report(music, top=3)
+    >>> report["artists"]
+        Year  Place     Artist  Hours listened
+    0   2019      1  Artist 24           45.12
+    1   2019      2  Artist 17           30.05
+    2   2019      3  Artist 42           29.38
+    3   2020      1  Artist 17           52.91
+    ...
+    """
+
+    if period not in PERIODS:
+        raise ValueError(
+            f"period must be one of {list(PERIODS)}, got '{period}'"
+        )
+    period_name = PERIODS[period]
+
+    ts = pd.to_datetime(df["ts"], utc=True)
+    if period == "year":
+        periods = ts.dt.year
+    else:
+        periods = ts.dt.strftime("%Y-%m")
+
+    whole_played = (df["reason_end"] == "trackdone").to_numpy()
+
+    events = pd.DataFrame(
+        {
+            period_name: periods,
+            **{column: df[column] for column in TRACK_COLUMNS},
+            "n_played": whole_played.astype(np.int32),
+            "n_skipped": (~whole_played).astype(np.int32),
+            # only count minutes of songs which were not skipped
+            "minutes_played": np.where(
+                whole_played, df["minutes_played"].to_numpy(), 0
+            ),
+        }
+    )
+
+    # single pass over the streaming history
+    songs = (
+        events.groupby([period_name, *TRACK_COLUMNS], observed=True)
+        .sum()
+        .reset_index()
+    )
+
+    albums = (
+        songs.groupby([period_name, *ALBUM_COLUMNS], observed=True)["n_played"]
+        .sum()
+        .reset_index()
+    )
+
+    artists = (
+        songs.groupby([period_name, *ARTIST_COLUMNS], observed=True)[
+            "minutes_played"
+        ]
+        .sum()
+        .reset_index()
+    )
+    artists["Hours listened"] = (
+        artists["minutes_played"].astype("float64") / 60
+    ).round(2)
+
+    report = {
+        "songs": _top_per_period(
+            songs[[period_name, *TRACK_COLUMNS, "n_played"]],
+            period_name,
+            "n_played",
+            top,
+        ).rename(columns={**NEW_NAMES, "n_played": "Times played"}),
+        "albums": _top_per_period(albums, period_name, "n_played", top).rename(
+            columns={**NEW_NAMES, "n_played": "Number of songs played"}
+        ),
+        "artists": _top_per_period(
+            artists[[period_name, *ARTIST_COLUMNS, "Hours listened"]],
+            period_name,
+            "Hours listened",
+            top,
+        ).rename(columns=NEW_NAMES),
+        "skipped_songs": _top_per_period(
+            songs[[period_name, *TRACK_COLUMNS, "n_skipped"]],
+            period_name,
+            "n_skipped",
+            top,
+        ).rename(columns={**NEW_NAMES, "n_skipped": "Times skipped"}),
+    }
+
+    return report
+
+
+def main(args: list[str] | None = None) -> None:
+    """
+    Command line entry point, e.g.
+    'spotify-wrapped streaming_history.csv --top 10 --year 2022'.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Your top songs, albums, artists and skipped songs "
+        "for every year of your streaming history."
+    )
+    parser.add_argument("path", help="path to streaming_history.csv")
+    parser.add_argument(
+        "--top", type=int, default=5, help="number of entries per period"
+    )
+    parser.add_argument(
+        "--period", choices=list(PERIODS), default="year", help="period"
+    )
+    parser.add_argument(
+        "--year", type=int, default=None, help="only show a single year"
+    )
+    parser.add_argument(
+        "--out-dir",
+        default=None,
+        help="write the report as csv files to this directory",
+    )
+    args = parser.parse_args(args)
+
+    music, _ = split_streams(pd.read_csv(args.path))
+
+    report = get_wrapped_report(music, period=args.period, top=args.top)
+
+    period_name = PERIODS[args.period]
+    for metric, data_frame in report.items():
+        if args.year is not None:
+            data_frame = data_frame[
+                data_frame[period_name]
+                .astype(str)
+                .str.startswith(str(args.year))
+            ]
+
+        if args.out_dir is not None:
+            os.makedirs(args.out_dir, exist_ok=True)
+            data_frame.to_csv(
+                os.path.join(args.out_dir, f"{metric}.csv"), index=False
+            )
+            continue
+
+        print(f"\n{metric.replace('_', ' ').capitalize()}\n")
+        print(data_frame.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
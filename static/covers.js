@@ -0,0 +1,50 @@
+// Load the covers and artist images of a table after the page is shown.
+// Placeholder images carry the track URI or artist, all of them are
+// resolved with a single request. Images which can not be loaded keep
+// the placeholder.
+document.addEventListener('DOMContentLoaded', function () {
+    var covers = document.querySelectorAll('img[data-track-uri]');
+    var artists = document.querySelectorAll('img[data-artist]');
+
+    if (covers.length === 0 && artists.length === 0) {
+        return;
+    }
+
+    var placeholder = (covers[0] || artists[0]).getAttribute('src');
+
+    function setImage(image, url) {
+        if (url) {
+            image.onerror = function () {
+                image.onerror = null;
+                image.src = placeholder;
+            };
+            image.src = url;
+        }
+    }
+
+    fetch('/api/covers', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            tracks: Array.from(covers, function (image) { return image.dataset.trackUri; }),
+            artists: Array.from(artists, function (image) { return image.dataset.artist; }),
+        }),
+    })
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json();
+        })
+        .then(function (data) {
+            covers.forEach(function (image) {
+                setImage(image, data.tracks[image.dataset.trackUri]);
+            });
+            artists.forEach(function (image) {
+                setImage(image, data.artists[image.dataset.artist]);
+            });
+        })
+        .catch(function () {
+            // keep the placeholders
+        });
+});